@@ -16,6 +16,7 @@ For larger datasets, see our [mysql_example](http://open-city.github.com/dedupe/
 from future.builtins import next
 
 import os
+import sys
 import csv
 import re
 import collections
@@ -26,6 +27,8 @@ from numpy import nan
 import dedupe
 from unidecode import unidecode
 
+import samplecache
+
 # ## Logging
 
 # Dedupe uses Python logging to show or suppress verbose output. Added for convenience.
@@ -34,6 +37,12 @@ optp = optparse.OptionParser()
 optp.add_option('-v', '--verbose', dest='verbose', action='count',
                 help='Increase verbosity (specify multiple times for more)'
                 )
+optp.add_option('-c', '--cache-dir', dest='cache_dir', default='.',
+                help='Directory for cached training samples'
+                )
+optp.add_option('--build-cache', dest='build_cache', action='store_true',
+                help='Draw and cache the training sample, then exit'
+                )
 (opts, args) = optp.parse_args()
 log_level = logging.WARNING
 if opts.verbose :
@@ -50,6 +59,13 @@ input_file = 'White_House_Visitor_Records_Requests.csv'
 output_file = 'WHV_example_output.csv'
 settings_file = 'csv_example_learned_settings'
 training_file = 'csv_example_training.json'
+sample_size = 15000
+
+# The drawn sample is cached per input file and sample size, so labeling
+# sessions can restart without rereading the whole CSV.
+sample_file = samplecache.cachePath(os.path.abspath(input_file),
+                                    samplecache.fileFingerprint(input_file),
+                                    sample_size, opts.cache_dir)
 
 
 def preProcess(column):
@@ -85,12 +101,11 @@ def readData(filename):
     return data_d
 
 
-print('importing data ...')
-data_d = readData(input_file)
+data_d = None
 
 # ## Training
 
-if os.path.exists(settings_file):
+if os.path.exists(settings_file) and not opts.build_cache:
     print('reading from', settings_file)
     with open(settings_file, 'rb') as f:
         deduper = dedupe.StaticDedupe(f)
@@ -108,10 +123,26 @@ else:
         ]
 
     # Create a new deduper object and pass our data model to it.
-    deduper = dedupe.Dedupe(fields)
-
-    # To train dedupe, we feed it a sample of records.
-    deduper.sample(data_d, 15000)
+    #
+    # To train dedupe, we feed it a sample of records. If we drew one
+    # before, load it from the cache instead of reading the data again.
+    if os.path.exists(sample_file) and not opts.build_cache:
+        print('reading sample from', sample_file)
+        data_sample, sampled_records = samplecache.readSample(sample_file)
+        deduper = dedupe.Dedupe(fields, data_sample)
+        # The constructor rebuilds sampled_records from the pairs alone;
+        # restore the ones drawn from the full data, as sample() would
+        deduper.sampled_records = sampled_records
+    else:
+        deduper = dedupe.Dedupe(fields)
+        print('importing data ...')
+        data_d = readData(input_file)
+        deduper.sample(data_d, sample_size)
+        samplecache.writeSample(deduper, sample_file)
+
+    if opts.build_cache:
+        print('sample cached in', sample_file)
+        sys.exit()
 
 
     # If we have training data saved from a previous run of dedupe,
@@ -145,6 +176,10 @@ else:
         deduper.writeSettings(sf)
 
 
+if data_d is None:
+    print('importing data ...')
+    data_d = readData(input_file)
+
 # ## Blocking
 
 print('blocking...')
@@ -12,8 +12,11 @@
 """
 Date/time parsing tools to assist with entity resolution project.
 """
+import os
 import csv
 import time
+import warnings
+import itertools
 import psycopg2
 import requests
 from datetime import datetime
@@ -28,7 +31,7 @@ try:
     print "I've connected"
 except:
     print "I am unable to connect to the database"
-cur = conn.cursor()
+cur = conn.cursor() if conn else None
 
 
 
@@ -43,6 +46,164 @@ def getData(url,fname):
     with open(fname, 'w') as f:
         f.write(response.content)
 
+CHUNKSIZE = 1024 * 1024
+
+def streamData(url, fname, cleanfile=None, chunksize=CHUNKSIZE, expected_size=None):
+    """
+    Download the dataset from the webpage in chunks rather than all at once.
+    If a partial download is already on disk, resume it with an HTTP Range
+    request, guarded by If-Range so a changed export is fetched from scratch
+    instead of being appended to the old prefix.
+
+    Once the transfer is done, verify the byte count against expected_size if
+    given, or else the size the server reported. The check is only as good as
+    those headers: dynamic exports are often sent chunked with no length at
+    all, in which case we warn and skip it.
+
+    If a cleanfile is given, the stream is also teed into the CSV cleaner, so
+    the datetime fields are parsed while the download is still running.
+    """
+    offset = os.path.getsize(fname) if os.path.exists(fname) else 0
+    validator = _readValidator(fname) if offset else None
+
+    # Ask for the file as-is: with gzip, the sizes in the headers count
+    # encoded bytes while iter_content yields decoded ones.
+    headers = {'Accept-Encoding': 'identity'}
+    if validator:
+        headers['Range'] = 'bytes=%d-' % offset
+        headers['If-Range'] = validator
+    response = requests.get(url, headers=headers, stream=True)
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        response.close()
+        raise IOError("Server ignored Accept-Encoding: identity")
+
+    if validator and response.status_code == 416:
+        # The server has nothing past our offset: the file should be complete
+        expected = _rangeTotal(response.headers.get('Content-Range'))
+        response.close()
+        if expected is not None and expected != offset:
+            # More on disk than the server has (e.g. a truncated export):
+            # the partial file can't be resumed, so throw it away
+            os.remove(fname)
+            os.remove(_validatorFile(fname))
+            return streamData(url, fname, cleanfile, chunksize, expected_size)
+        chunks = iter([])
+        mode = 'ab'
+    elif validator and response.status_code == 206:
+        if not response.headers.get('Content-Range'):
+            response.close()
+            raise IOError("Partial response without a Content-Range header")
+        start = _rangeStart(response.headers.get('Content-Range'))
+        if start != offset:
+            response.close()
+            raise IOError("Asked to resume at byte %s, server sent byte %s" % (offset, start))
+        expected = _rangeTotal(response.headers.get('Content-Range'))
+        chunks = response.iter_content(chunksize)
+        mode = 'ab'
+    else:
+        # Fresh download, no Range support, or the export changed: start over
+        response.raise_for_status()
+        offset = 0
+        _writeValidator(fname, response.headers)
+        length = response.headers.get('Content-Length')
+        expected = int(length) if length else None
+        chunks = response.iter_content(chunksize)
+        mode = 'wb'
+
+    with open(fname, mode) as f:
+        received = _teeChunks(chunks, f)
+        if cleanfile:
+            with open(fname, 'rb') as partial:
+                previous = _readChunks(partial, offset, chunksize)
+                dateParseLines(_chunkLines(itertools.chain(previous, received)), cleanfile)
+        for chunk in received:
+            pass
+
+    if expected_size is not None:
+        expected = expected_size
+    size = os.path.getsize(fname)
+    if expected is None:
+        warnings.warn("No size to verify %s against (%s bytes)" % (fname, size))
+    elif size != expected:
+        raise IOError("Downloaded %s bytes, expected %s" % (size, expected))
+    return size
+
+def _validatorFile(fname):
+    return fname + '.validator'
+
+def _readValidator(fname):
+    """
+    The ETag or Last-Modified value the partial download was started with.
+    Without one there is no safe way to resume, so we start over.
+    """
+    if not os.path.exists(_validatorFile(fname)):
+        return None
+    with open(_validatorFile(fname)) as f:
+        return f.read().strip() or None
+
+def _writeValidator(fname, headers):
+    """
+    Remember the validator of a fresh download so a resume can send If-Range.
+    Prefers the ETag, unless it is weak (If-Range only accepts strong ones).
+    """
+    validator = headers.get('ETag')
+    if not validator or validator.startswith('W/'):
+        validator = headers.get('Last-Modified')
+    if validator:
+        with open(_validatorFile(fname), 'w') as f:
+            f.write(validator)
+    elif os.path.exists(_validatorFile(fname)):
+        os.remove(_validatorFile(fname))
+
+def _rangeStart(header):
+    """
+    Pull the first byte position out of a 'bytes start-end/total' header.
+    """
+    return int(header.split()[1].split('-')[0])
+
+def _rangeTotal(header):
+    """
+    Pull the total size out of a 'bytes start-end/total' header, if known.
+    """
+    if not header:
+        return None
+    total = header.rsplit('/', 1)[-1]
+    return None if total == '*' else int(total)
+
+def _teeChunks(chunks, outfile):
+    """
+    Write each chunk to disk as it arrives, passing it along downstream.
+    """
+    for chunk in chunks:
+        if chunk:
+            outfile.write(chunk)
+            yield chunk
+
+def _readChunks(infile, limit, chunksize):
+    """
+    Replay the first limit bytes of a partial download, one chunk at a time.
+    """
+    while limit > 0:
+        chunk = infile.read(min(chunksize, limit))
+        if not chunk:
+            break
+        limit -= len(chunk)
+        yield chunk
+
+def _chunkLines(chunks):
+    """
+    Regroup a stream of chunks into lines, keeping the line endings so the
+    csv module can still handle newlines inside quoted fields.
+    """
+    tail = ''
+    for chunk in chunks:
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if tail:
+        yield tail
+
 #####################################################################
 # Parsing
 #####################################################################
@@ -55,21 +216,28 @@ def dateParseCSV(nfile,ofile):
     Create a clean file for entity resolution with just the fields:
     'lastname','firstname','uin','apptmade','apptstart','apptend', 'meeting_loc'
     """
+    with open(nfile, 'rb') as infile:
+        dateParseLines(infile, ofile)
+
+def dateParseLines(lines, ofile):
+    """
+    Same as dateParseCSV, but reads from any iterable of raw csv lines, e.g.
+    a download that is still in progress.
+    """
     with open(ofile, 'w') as outfile:
         writer = csv.writer(outfile, delimiter=',')
         writer.writerow(['lastname','firstname','uin','apptmade','apptstart','apptend','meeting_loc'])
-        with open(nfile, 'rb') as infile:
-            reader = csv.reader(infile, delimiter=',')
-            next(reader, None)
-            for row in reader:
-                for field in DATEFIELDS:
-                    if row[field] != '':
-                        try:
-                            dt = parser.parse(row[field])
-                            row[field] = dt.toordinal()
-                        except:
-                            continue
-                writer.writerow([row[0],row[1],row[3],row[10],row[11],row[12],row[21]])
+        reader = csv.reader(lines, delimiter=',')
+        next(reader, None)
+        for row in reader:
+            for field in DATEFIELDS:
+                if row[field] != '':
+                    try:
+                        dt = parser.parse(row[field])
+                        row[field] = dt.toordinal()
+                    except:
+                        continue
+            writer.writerow([row[0],row[1],row[3],row[10],row[11],row[12],row[21]])
 
 def dateParseSQL(nfile):
     """
@@ -124,6 +292,12 @@ if __name__ == '__main__':
     # print 'ran in', time.time() - start_time, 'seconds'
 
 
+    ## Or stream the download (resumable) and clean it as it arrives
+    # start_time = time.time()
+    # streamData(DATAURL,ORIGFILE,CLEANFILE)
+    # print 'ran in', time.time() - start_time, 'seconds'
+
+
     ## To parse the date time fields and output to a new PostgreSQL table - this will also take a while!
     start_time = time.time()
     dateParseSQL(ORIGFILE)
@@ -23,6 +23,8 @@ import dedupe
 import psycopg2
 from psycopg2.extras import DictCursor
 
+import samplecache
+
 
 KEY_FIELD = 'visitor_id'
 SOURCE_TABLE = 'test'  #'visitors'
@@ -74,25 +76,44 @@ def candidates_gen(result_set):
 
 # @profile
 def findDupes(args):
-    deduper = dedupe.Dedupe(FIELDS)
-
     with psycopg2.connect(database=args.dbname,
                           host='localhost',
                           cursor_factory=DictCursor) as con:
         with con.cursor() as c:
             # Generate a sample size
-            c.execute('SELECT COUNT(*) AS count FROM %s' % SOURCE_TABLE)
+            c.execute('SELECT COUNT(*) AS count, MAX(%s) AS max_key FROM %s'
+                      % (KEY_FIELD, SOURCE_TABLE))
             row = c.fetchone()
             count = row['count']
             sample_size = int(count * args.sample)
-
-            # Create the sample (warning: very memory intensive)
-            print 'Generating sample of %s records' % sample_size
-            with con.cursor('deduper') as c_deduper:
-                c_deduper.execute('SELECT visitor_id,lastname,firstname,uin,meeting_loc FROM %s' % SOURCE_TABLE)
-                temp_d = dict((i, row) for i, row in enumerate(c_deduper))
-                deduper.sample(temp_d, sample_size)
-                del(temp_d)
+            fingerprint = samplecache.tableFingerprint(args.dbname, SOURCE_TABLE,
+                                                       count, row['max_key'])
+            sample_file = samplecache.cachePath('%s.%s' % (args.dbname, SOURCE_TABLE),
+                                                fingerprint, sample_size, args.cache_dir)
+
+            if os.path.exists(sample_file) and not args.build_cache:
+                print 'Loading cached sample from %s' % sample_file
+                data_sample, sampled_records = samplecache.readSample(sample_file)
+                deduper = dedupe.Dedupe(FIELDS, data_sample)
+                # The constructor rebuilds sampled_records from the pairs alone;
+                # restore the ones drawn from the full table, as sample() would
+                deduper.sampled_records = sampled_records
+            else:
+                deduper = dedupe.Dedupe(FIELDS)
+
+                # Create the sample (warning: very memory intensive)
+                print 'Generating sample of %s records' % sample_size
+                with con.cursor('deduper') as c_deduper:
+                    c_deduper.execute('SELECT visitor_id,lastname,firstname,uin,meeting_loc FROM %s' % SOURCE_TABLE)
+                    temp_d = dict((i, row) for i, row in enumerate(c_deduper))
+                    deduper.sample(temp_d, sample_size)
+                    del(temp_d)
+
+                print 'Saving sample to %s' % sample_file
+                samplecache.writeSample(deduper, sample_file)
+
+            if args.build_cache:
+                return
 
             # Load training data (no problem if it doesn't exist yet)
             if os.path.exists(args.training):
@@ -277,6 +298,10 @@ if __name__ == '__main__':
                         help='sample size (percentage, default 0.10)')
     parser.add_argument('-t', '--training', default='training.json',
                         help='name of training file')
+    parser.add_argument('-c', '--cache-dir', default='.',
+                        help='directory for cached training samples')
+    parser.add_argument('--build-cache', action='store_true',
+                        help='draw and cache the training sample, then exit')
     args = parser.parse_args()
 
 
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# samplecache.py
+#
+#
+# Title:        Cached Training Samples for Entity Resolution Project
+# Version:      1.0
+# Organization: District Data Labs
+
+
+"""
+Tools to persist the sample dedupe draws for active learning.
+
+Drawing the sample means reading and preprocessing the whole source, which
+is the slow part of starting a labeling session. The drawn pairs (with their
+preprocessed records) are written to a gzipped pickle keyed by a fingerprint
+of the source and the sample size, so the next session can load them and go
+straight to labeling with the existing training file.
+
+Only the newest cache for each source is kept: writing a sample removes the
+other cache files for the same source, whatever their sample size.
+"""
+import os
+import glob
+import gzip
+import hashlib
+import cPickle as pickle
+
+
+#####################################################################
+# Cache keys
+#####################################################################
+def fileFingerprint(filename):
+    """
+    Fingerprint a CSV source by its path, size and modification time.
+    """
+    stat = os.stat(filename)
+    return _digest(os.path.abspath(filename), stat.st_size, int(stat.st_mtime))
+
+def tableFingerprint(dbname, table, count, max_key):
+    """
+    Fingerprint a database source by its table, row count and largest key.
+    """
+    return _digest(dbname, table, count, max_key)
+
+def _digest(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts)).hexdigest()
+
+CACHE_VERSION = 1
+
+def cachePath(source, fingerprint, sample_size, cache_dir='.'):
+    """
+    Name of the cache file for this source and sample size. The source
+    (e.g. a CSV path or 'db.table') stays the same as the data changes, so
+    stale caches for it can be found; the fingerprint tells them apart.
+    """
+    return os.path.join(cache_dir, 'sample_%s_%s_%s.v%d.pkl.gz'
+                        % (_digest(source)[:8], fingerprint[:16], sample_size, CACHE_VERSION))
+
+
+#####################################################################
+# Reading and writing
+#####################################################################
+def writeSample(deduper, path):
+    """
+    Save the sample the deduper just drew: the record pairs for active
+    learning and the sampled records the blocker is trained on. Writes to a
+    temp file first so an interrupted job never leaves a truncated cache,
+    then removes any older caches for the same source.
+    """
+    sample = {'data_sample': deduper.data_sample,
+              'sampled_records': deduper.sampled_records}
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wb') as f:
+        pickle.dump(sample, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, path)
+
+    cache_dir, name = os.path.split(path)
+    source_key = name.split('_')[1]
+    for stale in glob.glob(os.path.join(cache_dir, 'sample_%s_*.pkl.gz' % source_key)):
+        if stale != path:
+            os.remove(stale)
+
+def readSample(path):
+    """
+    Load a cached sample. Returns the record pairs, to pass to
+    dedupe.Dedupe(fields, data_sample), and the sampled records.
+    """
+    with gzip.open(path, 'rb') as f:
+        sample = pickle.load(f)
+    return sample['data_sample'], sample['sampled_records']
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# test_dateparse.py
+#
+#
+# Title:        Tests for the streaming download in dateparse.py
+# Organization: District Data Labs
+
+
+"""
+Exercise dateparse.streamData offline, against a local HTTP server that
+serves a fixture CSV with Range, If-Range and gzip support.
+
+Run from the project root with: python -m unittest discover tests
+"""
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+import warnings
+import threading
+import BaseHTTPServer
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import dateparse
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'visitors.csv')
+
+
+#####################################################################
+# Fixture server
+#####################################################################
+class FixtureHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves server.body, honouring Range only while If-Range matches the
+    current ETag, and gzipping whenever the client says it accepts gzip.
+    The send_length and send_range flags drop the Content-Length and (on a
+    206) the Content-Range headers, like a sloppy dynamic export would.
+    """
+    def do_GET(self):
+        body = self.server.body
+        etag = self.server.etag
+        start = None
+        if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+
+        if start is not None and start >= len(body):
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % len(body))
+            self.end_headers()
+            return
+
+        if start is not None:
+            self.send_response(206)
+            if self.server.send_range:
+                self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(body) - 1, len(body)))
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = StringIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+                gz.write(body)
+            body = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        if self.server.send_length:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+#####################################################################
+# Tests
+#####################################################################
+class StreamDataTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, 'rb') as f:
+            cls.body = f.read()
+        cls.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), FixtureHandler)
+        cls.url = 'http://127.0.0.1:%d/visitors.csv' % cls.server.server_port
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.body = self.body
+        self.server.etag = '"v1"'
+        self.server.send_length = True
+        self.server.send_range = True
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, 'visitors.csv')
+        self.cleanfile = os.path.join(self.tmpdir, 'visitors-cl.csv')
+        self.expected = os.path.join(self.tmpdir, 'expected-cl.csv')
+        dateparse.dateParseCSV(FIXTURE, self.expected)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, fname):
+        with open(fname, 'rb') as f:
+            return f.read()
+
+    def writePartial(self, data, validator='"v1"'):
+        with open(self.fname, 'wb') as f:
+            f.write(data)
+        with open(self.fname + '.validator', 'w') as f:
+            f.write(validator)
+
+    def testFreshDownload(self):
+        size = dateparse.streamData(self.url, self.fname, self.cleanfile, chunksize=64)
+        self.assertEqual(size, len(self.body))
+        self.assertEqual(self.read(self.fname), self.body)
+        self.assertEqual(self.read(self.cleanfile), self.read(self.expected))
+        self.assertEqual(self.read(self.fname + '.validator'), '"v1"')
+
+    def testResumeFromPartial(self):
+        self.writePartial(self.body[:1000])
+        size = dateparse.streamData(self.url, self.fname, self.cleanfile, chunksize=64)
+        self.assertEqual(size, len(self.body))
+        self.assertEqual(self.read(self.fname), self.body)
+        self.assertEqual(self.read(self.cleanfile), self.read(self.expected))
+
+    def testChangedExportStartsOver(self):
+        self.writePartial('stale prefix from an older export\n' * 30)
+        self.server.etag = '"v2"'
+        dateparse.streamData(self.url, self.fname, self.cleanfile, chunksize=64)
+        self.assertEqual(self.read(self.fname), self.body)
+        self.assertEqual(self.read(self.cleanfile), self.read(self.expected))
+        self.assertEqual(self.read(self.fname + '.validator'), '"v2"')
+
+    def testAlreadyComplete(self):
+        self.writePartial(self.body)
+        size = dateparse.streamData(self.url, self.fname, self.cleanfile)
+        self.assertEqual(size, len(self.body))
+        self.assertEqual(self.read(self.fname), self.body)
+        self.assertEqual(self.read(self.cleanfile), self.read(self.expected))
+
+    def testLargerThanRemoteStartsOver(self):
+        self.writePartial(self.body + 'trailing junk')
+        size = dateparse.streamData(self.url, self.fname, self.cleanfile)
+        self.assertEqual(size, len(self.body))
+        self.assertEqual(self.read(self.fname), self.body)
+        self.assertEqual(self.read(self.cleanfile), self.read(self.expected))
+
+    def testSizeMismatch(self):
+        self.assertRaises(IOError, dateparse.streamData, self.url, self.fname,
+                          expected_size=len(self.body) + 1)
+
+    def testNoLengthWarns(self):
+        self.server.send_length = False
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            size = dateparse.streamData(self.url, self.fname)
+        self.assertEqual(size, len(self.body))
+        self.assertEqual(len(caught), 1)
+        self.assertIn('No size to verify', str(caught[0].message))
+
+    def testNoLengthWithExpectedSize(self):
+        self.server.send_length = False
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            dateparse.streamData(self.url, self.fname, expected_size=len(self.body))
+        self.assertEqual(caught, [])
+        self.assertRaises(IOError, dateparse.streamData, self.url, self.fname + '.2',
+                          expected_size=len(self.body) - 1)
+
+    def testPartialWithoutContentRange(self):
+        self.server.send_range = False
+        self.writePartial(self.body[:1000])
+        self.assertRaises(IOError, dateparse.streamData, self.url, self.fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# test_samplecache.py
+#
+#
+# Title:        Tests for the cached training samples in samplecache.py
+# Organization: District Data Labs
+
+
+"""
+Check that a cached sample round-trips and that cache keys follow the source.
+
+Run from the project root with: python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import samplecache
+
+
+#####################################################################
+# Stand-ins for dedupe objects
+#####################################################################
+class Sample(dict):
+    """
+    Mirrors dedupe's Sample: a dict of records plus the size of the data
+    it was drawn from, which the blocker uses to scale up block sizes.
+    """
+    def __init__(self, d, original_length):
+        super(Sample, self).__init__(d)
+        self.original_length = original_length
+
+class Deduper(object):
+    """
+    Just the attributes Dedupe.sample() leaves behind.
+    """
+    def __init__(self, data_sample, sampled_records):
+        self.data_sample = data_sample
+        self.sampled_records = sampled_records
+
+
+#####################################################################
+# Tests
+#####################################################################
+class SampleCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'visitors.csv')
+        with open(self.source, 'w') as f:
+            f.write('lastname,firstname\nsmith,anna\n')
+
+        records = dict((i, {'lastname': u'smith', 'firstname': u'anna %d' % i})
+                       for i in range(10))
+        self.deduper = Deduper([(records[0], records[1]), (records[2], records[3])],
+                               Sample(records, 5000))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def cachePath(self, sample_size=15000, source=None):
+        source = source or self.source
+        return samplecache.cachePath(source, samplecache.fileFingerprint(self.source),
+                                     sample_size, self.tmpdir)
+
+    def testRoundTrip(self):
+        path = self.cachePath()
+        samplecache.writeSample(self.deduper, path)
+        data_sample, sampled_records = samplecache.readSample(path)
+
+        self.assertEqual(data_sample, self.deduper.data_sample)
+        self.assertEqual(sampled_records, self.deduper.sampled_records)
+        self.assertIsInstance(sampled_records, Sample)
+        self.assertEqual(sampled_records.original_length, 5000)
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    def testCachePathKeys(self):
+        fingerprint = samplecache.fileFingerprint(self.source)
+        path = samplecache.cachePath(self.source, fingerprint, 15000)
+        self.assertNotEqual(path, samplecache.cachePath(self.source, fingerprint, 20000))
+        self.assertNotEqual(path, samplecache.cachePath(self.source, fingerprint[::-1], 15000))
+        self.assertNotEqual(path, samplecache.cachePath('wh.visitors', fingerprint, 15000))
+        self.assertEqual(os.path.dirname(samplecache.cachePath(self.source, fingerprint, 15000, 'cache')),
+                         'cache')
+
+    def testFingerprintFollowsSize(self):
+        before = samplecache.fileFingerprint(self.source)
+        stat = os.stat(self.source)
+        with open(self.source, 'a') as f:
+            f.write('jones,ben\n')
+        os.utime(self.source, (stat.st_atime, stat.st_mtime))
+        self.assertNotEqual(before, samplecache.fileFingerprint(self.source))
+
+    def testFingerprintFollowsMtime(self):
+        before = samplecache.fileFingerprint(self.source)
+        self.assertEqual(before, samplecache.fileFingerprint(self.source))
+        os.utime(self.source, (time.time(), os.stat(self.source).st_mtime + 60))
+        self.assertNotEqual(before, samplecache.fileFingerprint(self.source))
+
+    def testWritePrunesStaleCachesForSource(self):
+        other_source = self.cachePath(source='wh.visitors')
+        samplecache.writeSample(self.deduper, other_source)
+        old = self.cachePath(sample_size=20000)
+        samplecache.writeSample(self.deduper, old)
+
+        os.utime(self.source, (time.time(), os.stat(self.source).st_mtime + 60))
+        new = self.cachePath()
+        samplecache.writeSample(self.deduper, new)
+
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertTrue(os.path.exists(other_source))
+
+
+if __name__ == '__main__':
+    unittest.main()